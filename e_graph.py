@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Union, List, Set, Dict
+from typing import Union, List, Set, Dict, Tuple
 
 from union_find import UnionFind
 
@@ -7,9 +7,12 @@ from union_find import UnionFind
 class E_NODE:
     """Represents an e-node (operator or value with children e-class IDs)."""
 
-    def __init__(self, value: Union[str, int, float], children_ids: List[int]):
+    __slots__ = ("value", "children", "_hash")
+
+    def __init__(self, value: Union[str, int, float], children_ids: Union[List[int], Tuple[int, ...]]):
         self.value = value  # The function symbol ('*', '/', 'a', '1', etc)
-        self.children: List[int] = children_ids  # Child e-class IDs
+        self.children: Tuple[int, ...] = tuple(children_ids)  # Child e-class IDs
+        self._hash = None  # Lazily cached hash, e-nodes are hashed constantly
 
     def __repr__(self) -> str:
         # Represent using child IDs
@@ -17,23 +20,35 @@ class E_NODE:
 
     # Need eq and hash for storing in sets within E_CLASS
     def __eq__(self, other):
-        if not isinstance(other, E_NODE):
+        if type(other) is not E_NODE:  # exact type check, cheaper than isinstance and E_NODE isn't subclassed
             return NotImplemented
+        # Different cached hashes mean the nodes can't be equal, so the common
+        # negative case (hashcons/set collisions) is settled by one int compare.
+        # Only valid when both hashes have actually been computed (not None).
+        self_hash = self._hash
+        other_hash = other._hash
+        if self_hash is not None and other_hash is not None and self_hash != other_hash:
+            return False
         # E-nodes are equal if value and children IDs are the same
         return self.value == other.value and self.children == other.children
 
     def __hash__(self):
-        # Hash based on value and tuple of children IDs
-        return hash((self.value, tuple(self.children)))
+        # Hash based on value and children IDs, computed once and cached
+        h = self._hash
+        if h is None:
+            h = self._hash = hash((self.value, self.children))
+        return h
 
 
 class E_CLASS:
     """Represents an e-class (an equivalence class of e-nodes)."""
 
+    __slots__ = ("id", "nodes", "parents", "analysis_data")
+
     def __init__(self, id: int, nodes: Set[E_NODE] = None):
         self.id = id  # Unique identifier for this e-class
         self.nodes: Set[E_NODE] = set() if nodes == None else nodes # Set of e-nodes belonging to this class
-        self.parents: Set[E_NODE] = set()
+        self.parents: Dict[E_NODE, int] = {}  # {parent e-node: its e-class id}
         self.analysis_data = None
 
     def add_node(self, node: E_NODE):
@@ -62,9 +77,9 @@ class E_GRAPH:
         self.classes: Dict[int, E_CLASS] = {}
         # In a full implementation, would also have union-find, hashcons, etc.
         self.union_find = UnionFind()  # {id: parent_id} for Union-Find
-        self.hashcons = {}  # {(op, *child_ids): eclass_id}
+        self.hashcons = {}  # {(op_id, *child_ids): (eclass_id, canonical_enode)}
+        self._sym_id: Dict[Union[str, int, float], int] = {}  # {symbol: small int} interning table for hashcons keys
         self.next_id = 0  # Counter to generate fresh IDs
-        self.parents: Dict[int, Set[E_NODE]] = {}  # {eclass_id: set of parent e-nodes}
         self.worklist: Set[int] = set() # E-class IDs needing repair
 
     def get_new_id(self) -> int:
@@ -79,97 +94,183 @@ class E_GRAPH:
         # Simple addition for this example
         self.classes[eclass.id] = eclass
 
+    def _intern(self, sym: Union[str, int, float]) -> int:
+        # Map a symbol to a small int so hashcons keys are pure int tuples;
+        # the dict keeps '1' and 1 distinct without any tagging
+        table = self._sym_id
+        sym_id = table.get(sym)
+        if sym_id is None:
+            sym_id = table[sym] = len(table)
+        return sym_id
+
+    def _key(self, enode: E_NODE) -> tuple:
+        # Canonical tuple form of an e-node, used as the hashcons key. A plain
+        # tuple of ints hashes at C level and doesn't tie the table to E_NODE
+        # identity. Fast paths for the common arities (leaves and binary
+        # operators) skip the generic tuple build and its per-child overhead.
+        children = enode.children
+        n = len(children)
+        if n == 0:
+            return (self._intern(enode.value),)
+
+        find = self.union_find.find
+        if n == 2:
+            return (self._intern(enode.value), find(children[0]), find(children[1]))
+        if n == 1:
+            return (self._intern(enode.value), find(children[0]))
+        return (self._intern(enode.value), *[find(c) for c in children])
+
     def add_node(self, enode: E_NODE):
-        # Step 1: Canonicalize children using Union-Find
-        canonical_enode = self.canonicalize(enode)
+        # Bind the hot attributes once, every extra self. lookup costs here
+        hashcons = self.hashcons
+        classes = self.classes
+
+        # Step 1: Canonicalize children using Union-Find (the key is the canonical form)
+        key = self._key(enode)
 
         # Step 2: Hashconsing (check for existing congruent e-node)
-        if canonical_enode in self.hashcons:
-            return self.hashcons[
-                canonical_enode
-            ]  # Return existing e-class ID, so this means the enode can already be added to an existisng e_class
+        entry = hashcons.get(key)
+        if entry is not None:
+            # the stored id is only re-found during repair, so between a merge
+            # and the next rebuild it can name a root whose classes entry is
+            # gone; hand back the live root instead
+            return self.union_find.find(entry[0])  # Return existing e-class ID, so this means the enode can already be added to an existisng e_class
 
         # Step 3: Create new e-class
+        canonical_enode = E_NODE(enode.value, key[1:])
         new_id = self.get_new_id()
 
-        self.union_find.parent[new_id] = new_id  # Ensure new_id is in Union-Find
+        self.union_find.make_set(new_id)  # Ensure new_id is in Union-Find
         new_class = E_CLASS(new_id)
         new_class.add_node(canonical_enode)
-        self.classes[new_id] = new_class
-        self.hashcons[canonical_enode] = new_id
+        classes[new_id] = new_class
+        hashcons[key] = (new_id, canonical_enode)
 
         # Step 4: Update parents of children
         for c in canonical_enode.children:
-            self.classes[c].parents.add(enode)
+            classes[c].parents[canonical_enode] = new_id
 
         return new_id
 
     def canonicalize(self, enode: E_NODE) -> E_NODE:
-        canonical_children = [self.union_find.find(e) for e in enode.children]
-
-        return E_NODE(enode.value, canonical_children)
+        # Equal canonical forms hash-cons to a single class, so reuse the
+        # e-node already stored there instead of allocating a fresh one;
+        # only a miss (a form not seen yet) pays for a new E_NODE
+        key = self._key(enode)
+        entry = self.hashcons.get(key)
+        if entry is not None:
+            return entry[1]
+        return E_NODE(enode.value, key[1:])
 
     def merge(self, a: int, b: int):
+        if a == b:
+            return  # no-op merge, skip the two find calls
+
         a_root = self.union_find.find(a)
         b_root = self.union_find.find(b)
 
         if a_root == b_root:
             return
 
-        # Union the classes
-        self.union_find.union(a_root, b_root)
-        merged_id = self.union_find.find(a_root)
-        merged_class = E_CLASS(merged_id, self.classes[a_root].nodes | self.classes[b_root].nodes)
-
-        # Update classes and parents
-        self.classes[merged_id] = merged_class
+        # Union the classes; union-by-rank decides which root survives
+        merged_id = self.union_find.union(a_root, b_root)
+        other_id = b_root if merged_id == a_root else a_root
+
+        # Fold the smaller class into the larger one in place (small-to-large):
+        # each e-node moves at most O(log N) times overall, instead of copying
+        # both node sets on every merge
+        a_class = self.classes[a_root]
+        b_class = self.classes[b_root]
+        if len(a_class.nodes) <= len(b_class.nodes):
+            small, large = a_class, b_class
+        else:
+            small, large = b_class, a_class
+        large.nodes.update(small.nodes)
+
+        # fold the smaller parent map in, watching for key collisions: both
+        # sides can hold the same parent node keyed to different e-class ids
+        # (one side re-keyed by an earlier repair), and a plain update would
+        # clobber one id without ever merging the congruent classes
+        find = self.union_find.find
+        large_parents = large.parents
+        pending_merges = []
+        for pnode, pnode_eclass in small.parents.items():
+            existing_eclass = large_parents.get(pnode)
+            if existing_eclass is not None and find(existing_eclass) != find(pnode_eclass):
+                pending_merges.append((existing_eclass, pnode_eclass))
+            large_parents[pnode] = pnode_eclass
+        large.id = merged_id
+
+        # Update classes and parents; the losing root's entry goes away so
+        # classes only ever holds live canonical roots
+        self.classes[merged_id] = large
+        del self.classes[other_id]
         self.worklist.add(merged_id)  # Schedule for rebuilding to make congruence
 
+        # run the collision merges only after this merge's bookkeeping is
+        # done, so the recursive calls see a consistent classes table
+        for x, y in pending_merges:
+            self.merge(x, y)
+
     def rebuild(self):
         while self.worklist:
-            # empty the worklist into a local variable
-            eclass_id = self.worklist.pop()
-
-            # canonicalize and deduplicate the eclass refs to save calls for repair
-            eclass_id = self.union_find.find(eclass_id)
+            # empty the worklist into a local variable, canonicalize the whole
+            # batch through find_many and deduplicate the eclass refs to save
+            # calls for repair; merges made during repair land back on the
+            # worklist for the next pass
+            todo = set(self.union_find.find_many(self.worklist))
+            self.worklist.clear()
 
-            self.repair(eclass_id)
+            for eclass_id in todo:
+                self.repair(eclass_id)
 
     def repair(self, eclass: int):
-        parents_to_update = set()
-        # update the hashcons so it always points canonical enodes to canonical eclasses. So root nodes are joined to a root eclass, like if we have two division roots we joined them to have one enode and eclass, or they could be different enodes and they get joined to a unique eclass root
-        for enode in self.classes[eclass].parents:
-            # Remove old hashcons entry
+        find = self.union_find.find
+        hashcons = self.hashcons
+
+        # merges earlier in the same rebuild batch may have merged this class
+        # away, and only live roots keep a classes entry, so re-find first
+        eclass_obj = self.classes[find(eclass)]
+
+        # drain the parent map before iterating: a congruence merge below can
+        # target this very class (cyclic classes like a = a*1) and fold more
+        # parents into it, which must land in a fresh dict and not mutate the
+        # one being iterated
+        old_parents = eclass_obj.parents
+        eclass_obj.parents = {}
+
+        # update the hashcons so it always points canonical enodes to canonical eclasses, and deduplicate the parents in the same pass: congruent parents (equal canonical forms) get their e-classes merged and put back on the worklist. So root nodes are joined to a root eclass, like if we have two division roots we joined them to have one enode and eclass, or they could be different enodes and they get joined to a unique eclass root
+        new_parents: Dict[E_NODE, int] = {} # check the nodes that are equal so that we merged their eclasses
+        for enode, enode_eclass in old_parents.items():
+            # Remove old hashcons entry, keyed by the parent's previous canonical form
+            hashcons.pop((self._intern(enode.value), *enode.children), None) # we are removing the class of this canoncial node in a way
+
             canonical_enode = self.canonicalize(enode)
-            current_eclass = self.hashcons[enode]
-            if enode in self.hashcons:
-                del self.hashcons[enode] # we are removing the class of this canoncial node in a way
-
-            # Reinsert with canonicalized children
-            # new_enode = E_NODE(enode.value, [self.union_find.find(c) for c in enode.children])
-            self.hashcons[canonical_enode] = self.union_find.find(current_eclass)
-
-            parents_to_update.add(canonical_enode)
-
-        # deduplicate the parents, noting that equal parents get merged and put on the worklist
-        new_parents = {} # check the nodes that are equal so that we merged their eclasses
-        # for enode in parents_to_update:
-        for enode in self.classes[eclass].parents:
-            key_original = enode
-            enode = self.canonicalize(enode)
-
-            if enode in new_parents:
-                # Existing parent's e-class ID
-                existing_eclass = new_parents[key_original]
-                # Current parent's e-class ID (from hashcons)
-                current_eclass = self.hashcons[enode]
+            existing_eclass = new_parents.get(canonical_enode)
+            if existing_eclass is not None:
                 # Merge the two e-classes of congruent parents
-                self.merge(existing_eclass, current_eclass) # merge the existing class and the class of the enode
-
-            existing_eclass = new_parents[key_original]
-            new_parents[enode] = self.union_find.find(existing_eclass)
-
-        self.classes[eclass].parents = set(new_parents.keys())
+                self.merge(enode_eclass, existing_eclass)
+
+            # Reinsert with canonicalized children (the reused canonical
+            # node's children are canonical right now, so its key is direct)
+            enode_eclass = find(enode_eclass)
+            new_parents[canonical_enode] = enode_eclass
+            hashcons[(self._intern(enode.value), *canonical_enode.children)] = (enode_eclass, canonical_enode)
+
+        # merge the deduplicated parents into the live root's map rather than
+        # overwriting it: mid-loop congruence merges may have folded parents
+        # into the repaired class, and both maps can hold the same canonical
+        # node keyed to different e-class ids — those are congruent, so merge
+        # them instead of letting a plain dict update clobber one. The merges
+        # can move the repaired class itself (cycles), so re-find the live
+        # root's map on every step
+        for canonical_enode, enode_eclass in new_parents.items():
+            live_parents = self.classes[find(eclass)].parents
+            existing_eclass = live_parents.get(canonical_enode)
+            if existing_eclass is not None and find(existing_eclass) != find(enode_eclass):
+                self.merge(existing_eclass, enode_eclass)
+                live_parents = self.classes[find(eclass)].parents
+            live_parents[canonical_enode] = find(enode_eclass)
 
     def __repr__(self):
         lines = ["E-Graph Structure:"]
@@ -180,23 +281,32 @@ class E_GRAPH:
     def pretty_print(self):
         lines = ["\nE-Graph Contents:\n================="]
 
+        # Memoize find once up front: the nested loops below would otherwise
+        # redo the same lookup for every child of every node of every class
+        find = self.union_find.find
+        canon = {cid: find(cid) for cid in self.classes}
+
+        def canon_of(cid: int) -> int:
+            cached = canon.get(cid)
+            return find(cid) if cached is None else cached
+
         # Group e-classes by their canonical ID
-        canonical_ids = sorted(set(self.union_find.find(cid) for cid in self.classes))
+        canonical_ids = sorted(set(canon.values()))
         for cid in canonical_ids:
-            canonical_class = self.classes[self.union_find.find(cid)]
+            canonical_class = self.classes[cid]
             lines.append(f"\nEClass {cid}:")
             for enode in sorted(canonical_class.nodes, key=lambda n: repr(n)):
-                child_strs = ', '.join(str(self.union_find.find(c)) for c in enode.children)
+                child_strs = ', '.join(str(canon_of(c)) for c in enode.children)
                 lines.append(f"  {enode.value}({child_strs})")
 
             if canonical_class.parents:
                 lines.append(f"  ↑ Parents:")
                 for parent in sorted(canonical_class.parents, key=lambda n: repr(n)):
-                    child_strs = ', '.join(str(self.union_find.find(c)) for c in parent.children)
+                    child_strs = ', '.join(str(canon_of(c)) for c in parent.children)
                     lines.append(f"    {parent.value}({child_strs})")
 
         lines.append("\nUnion-Find State:")
-        for k in sorted(self.union_find.parent.keys()):
+        for k in range(1, self.next_id + 1):
             lines.append(f"  {k} → {self.union_find.find(k)}")
 
         return "\n".join(lines)
@@ -0,0 +1,116 @@
+from __future__ import annotations
+import random
+from typing import Dict, List, Set, Tuple
+
+from e_graph import E_GRAPH, E_NODE
+
+
+def oracle_partition(terms: List[Tuple[str, Tuple[int, ...]]], merges: List[Tuple[int, int]]) -> Set[frozenset]:
+    """Brute-force congruence closure over term indices, the ground truth the
+    e-graph's partition must match after rebuild."""
+    parent = {i: i for i in range(len(terms))}
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(x: int, y: int):
+        parent[find(x)] = find(y)
+
+    for a, b in merges:
+        union(a, b)
+
+    # re-run until fixpoint: merging classes can make more terms congruent
+    changed = True
+    while changed:
+        changed = False
+        forms: Dict[tuple, int] = {}
+        for i, (value, children) in enumerate(terms):
+            key = (value, tuple(find(c) for c in children))
+            j = forms.setdefault(key, i)
+            if find(i) != find(j):
+                union(i, j)
+                changed = True
+
+    groups: Dict[int, set] = {}
+    for i in range(len(terms)):
+        groups.setdefault(find(i), set()).add(i)
+    return {frozenset(g) for g in groups.values()}
+
+
+def egraph_partition(ids: List[int], graph: E_GRAPH) -> Set[frozenset]:
+    find = graph.union_find.find
+    groups: Dict[int, set] = {}
+    for i, eid in enumerate(ids):
+        groups.setdefault(find(eid), set()).add(i)
+    return {frozenset(g) for g in groups.values()}
+
+
+def run_random_workload(seed: int, max_ops: int, max_leaves: int) -> bool:
+    # random adds, merges and rebuilds; merges are deliberately batched
+    # (rebuild only sometimes) so repair sees cascading congruences
+    random.seed(seed)
+    terms: List[Tuple[str, Tuple[int, ...]]] = []
+    ids: List[int] = []
+    merges: List[Tuple[int, int]] = []
+    graph = E_GRAPH()
+
+    for _ in range(random.randint(2, max_leaves)):
+        value = f"x{random.randint(0, 3)}"
+        terms.append((value, ()))
+        ids.append(graph.add_node(E_NODE(value, [])))
+
+    for _ in range(random.randint(2, max_ops)):
+        r = random.random()
+        if r < 0.55:
+            arity = random.randint(1, 2)
+            children = tuple(random.randrange(len(terms)) for _ in range(arity))
+            value = random.choice("*+/<f")
+            terms.append((value, children))
+            ids.append(graph.add_node(E_NODE(value, [ids[c] for c in children])))
+        elif r < 0.85:
+            a, b = random.randrange(len(terms)), random.randrange(len(terms))
+            merges.append((a, b))
+            graph.merge(ids[a], ids[b])
+        else:
+            graph.rebuild()
+    graph.rebuild()
+
+    return egraph_partition(ids, graph) == oracle_partition(terms, merges)
+
+
+def test_cyclic_merge_rebuild():
+    # a = a*1 makes the class its own parent; repair must survive merges
+    # that fold parents into the very class it is repairing
+    graph = E_GRAPH()
+    id_a = graph.add_node(E_NODE('a', []))
+    id_1 = graph.add_node(E_NODE('1', []))
+    id_mul_a = graph.add_node(E_NODE('*', [id_a, id_1]))
+    graph.merge(id_a, id_mul_a)
+    id_b = graph.add_node(E_NODE('b', []))
+    id_mul_b = graph.add_node(E_NODE('*', [id_b, id_1]))
+    graph.add_node(E_NODE('f', [id_mul_b]))
+    graph.merge(id_a, id_b)
+    graph.rebuild()
+
+    find = graph.union_find.find
+    assert find(id_mul_a) == find(id_a) == find(id_b) == find(id_mul_b)
+
+
+def test_congruence_matches_oracle_small():
+    failing = [seed for seed in range(3000) if not run_random_workload(seed, max_ops=15, max_leaves=6)]
+    assert not failing, f"partition mismatch vs oracle on seeds {failing[:10]}"
+
+
+def test_congruence_matches_oracle_large():
+    failing = [seed for seed in range(2000) if not run_random_workload(100000 + seed, max_ops=30, max_leaves=10)]
+    assert not failing, f"partition mismatch vs oracle on seeds {failing[:10]}"
+
+
+if __name__ == "__main__":
+    test_cyclic_merge_rebuild()
+    test_congruence_matches_oracle_small()
+    test_congruence_matches_oracle_large()
+    print("all tests passed")
@@ -1,19 +1,61 @@
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Iterable, List
+
+
+def _find(parent: List[int], x: int) -> int:
+    # Hot kernel over the raw parent array, kept free of self/attribute
+    # lookups (and in the shape a numba @njit could compile as-is)
+    while parent[x] != x: # it means we haven't finished, we havent found the root (the root doesn't have a parent, so the parent its him)
+        parent[x] = parent[parent[x]]  # Path halving: point every other node at its grandparent and step there, so the chain halves every pass (splitting would step to the old parent instead)
+        x = parent[x]
+    return x
+
 
 class UnionFind:
     def __init__(self):
-        self.parent: Dict[int, int] = {}  # {id: parent_id}
+        # E-class ids are dense consecutive ints, so flat arrays indexed by id
+        # beat a dict: one int per slot instead of a whole hash entry, and
+        # scans over them stay cache friendly
+        self.parent: List[int] = []  # parent[id] = parent_id
+        self.rank: List[int] = []  # rank[root_id] = upper bound on tree height
+
+    def _grow(self, x: int):
+        # Grow geometrically so repeated make_set stays amortized O(1)
+        parent = self.parent
+        new_len = max(x + 1, 2 * len(parent), 64)
+        parent.extend(range(len(parent), new_len))  # new slots are their own parent
+        self.rank.extend([0] * (new_len - len(self.rank)))
+
+    def make_set(self, x: int) -> int:
+        if x >= len(self.parent):
+            self._grow(x)
+        return x
 
     def find(self, x: int) -> int:
-        if x not in self.parent:
-            self.parent[x] = x  # New element is its own parent
-        if self.parent[x] != x: # it means we haven't finished, we havent found the root (the root doesn't have a parent, so the parent its him)
-            self.parent[x] = self.find(self.parent[x])  # Path compression
-        return self.parent[x]
+        parent = self.parent
+        if x >= len(parent):
+            self._grow(x)  # New element is its own parent
+        return _find(parent, x)
+
+    def find_many(self, ids: Iterable[int]) -> List[int]:
+        # Canonicalize a whole batch of ids in one go (used by rebuild)
+        parent = self.parent
+        return [_find(parent, x) for x in ids]
+
+    def union(self, x: int, y: int) -> int:
+        if x == y:
+            return self.find(x)  # no-op union, one find instead of two
 
-    def union(self, x: int, y: int):
         x_root = self.find(x)
         y_root = self.find(y)
-        if x_root != y_root:
-            self.parent[y_root] = x_root # we make x_root the root of the set of x and y
+        if x_root == y_root:
+            return x_root
+        rank = self.rank
+        x_rank = rank[x_root]
+        y_rank = rank[y_root]
+        if x_rank < y_rank:
+            x_root, y_root = y_root, x_root  # always hang the shallower tree under the deeper one
+        self.parent[y_root] = x_root # we make x_root the root of the set of x and y
+        if x_rank == y_rank:
+            rank[x_root] = x_rank + 1
+        return x_root